@@ -12,14 +12,33 @@ A weighted sum that counts possible moves and, depending on the pieces we have l
 
 import random
 import sys
-import copy
-from cmath import inf
+from math import inf
 import time
+from multiprocessing import Pool
+from concurrent.futures import ProcessPoolExecutor
 
 LICZ_ROZGR = 4
+# player 1 plays by random playouts, else by the same minimax as player 0
+MC_OPPONENT = True
+# > 1: the playouts of player 1's root moves run in that many processes and
+# the benchmark games are played one after another
+WORKERS = 1
 MAX_DEPTH = 3
+ASPIRATION = 50
 A = 1
 B = 1
+TT_SIZE = 1 << 20
+EXACT, LOWER, UPPER = range(3)
+
+# rat, cat, dog, wolf, jaguar, tiger, lion, elephant
+PIECE_VALUES = (4, 1, 2, 3, 5, 7, 8, 10)
+# alive-pieces mask (bit pc set) -> sum of their values
+MATERIAL_SUM = tuple(sum(PIECE_VALUES[pc] for pc in range(8) if mask >> pc & 1)
+                     for mask in range(256))
+TRAPS = frozenset({(2, 0), (4, 0), (3, 1), (2, 8), (4, 8), (3, 7)})
+PONDS = frozenset((x, y) for x in [1, 2, 4, 5] for y in [3, 4, 5])
+DENS = ((3, 8), (3, 0))
+DIRS = ((0, 1), (1, 0), (-1, 0), (0, -1))
 
 
 class WrongMove(Exception):
@@ -28,41 +47,162 @@ class WrongMove(Exception):
         super().__init__(self.message)
 
 
+def zobrist_keys(squares, maximal_passive):
+    rng = random.Random(0)
+    pieces = [[[rng.getrandbits(64) for sq in range(squares)]
+               for pc in range(8)] for pl in range(2)]
+    side = [0, rng.getrandbits(64)]
+    peace = [rng.getrandbits(64) for i in range(maximal_passive + 1)]
+    return pieces, side, peace
+
+
+def cell_mask(cells, mx):
+    mask = 0
+    for x, y in cells:
+        mask |= 1 << (y * mx + x)
+    return mask
+
+
+def neighbor_table(mx, my, dirs):
+    # square (x, y) is encoded as y * mx + x
+    table = []
+    for sq in range(mx * my):
+        y, x = divmod(sq, mx)
+        res = []
+        for dx, dy in dirs:
+            if 0 <= x + dx < mx and 0 <= y + dy < my:
+                res.append((sq + dy * mx + dx, dx, dy))
+        table.append(tuple(res))
+    return tuple(table)
+
+
+def can_beat_table(rat, elephant):
+    # [p1][p2][pos2 is a trap], for p1 standing on land
+    table = []
+    for p1 in range(8):
+        row = []
+        for p2 in range(8):
+            if p1 == elephant and p2 == rat:
+                row.append((False, False))
+            elif (p1 == rat and p2 == elephant) or p1 >= p2:
+                row.append((True, True))
+            else:
+                row.append((False, True))
+        table.append(tuple(row))
+    return tuple(table)
+
+
+def rat_block_mask(sq, dx, dy, mx, pond_mask):
+    # pond squares on which a rat (of either player) blocks the jump
+    # (dx, dy) from sq
+    y, x = divmod(sq, mx)
+    nx = x + dx
+    mask = 0
+    for r in range(pond_mask.bit_length()):
+        if not pond_mask >> r & 1:
+            continue
+        ry, rx = divmod(r, mx)
+        if dy != 0 and x == rx:
+            mask |= 1 << r
+        if dx != 0 and y == ry and abs(x-rx) <= 2 and abs(nx-rx) <= 2:
+            mask |= 1 << r
+    return mask
+
+
+def move_table(neighbor, mx, pond_mask, trap_mask, den_mask, can_beat,
+               rat, jumpers):
+    # [player][piece][sq] -> ((dst, 1 << dst, block, beats), ...) where block
+    # is the rat_block_mask of a jump over a pond (0 for a step) and
+    # beats[p2] tells whether p2 standing on dst can be taken
+    table = []
+    for player in [0, 1]:
+        by_piece = []
+        for p in range(8):
+            by_sq = []
+            for sq in range(len(neighbor)):
+                res = []
+                if pond_mask >> sq & 1 and p != rat:
+                    by_sq.append(tuple(res))  # only a rat can be there
+                    continue
+                for dst, dx, dy in neighbor[sq]:
+                    if den_mask[player] >> dst & 1:
+                        continue
+                    block = 0
+                    if pond_mask >> dst & 1 and p != rat:
+                        if p not in jumpers:
+                            continue
+                        if dx != 0:
+                            dx *= 3
+                        if dy != 0:
+                            dy *= 4
+                        block = rat_block_mask(sq, dx, dy, mx, pond_mask)
+                        dst = sq + dy * mx + dx
+                    if pond_mask >> sq & 1:
+                        # rat vs rat only
+                        beats = (pond_mask >> dst & 1 == 1,) * 8
+                    else:
+                        trap = trap_mask >> dst & 1
+                        beats = tuple(can_beat[p][p2][trap] for p2 in range(8))
+                    res.append((dst, 1 << dst, block, beats))
+                by_sq.append(tuple(res))
+            by_piece.append(tuple(by_sq))
+        table.append(tuple(by_piece))
+    return tuple(table)
+
+
 class Jungle:
-    PIECE_VALUES = {
-        0: 4,
-        1: 1,
-        2: 2,
-        3: 3,
-        4: 5,
-        5: 7,
-        6: 8,
-        7: 10
-    }
     MAXIMAL_PASSIVE = 30
     DENS_DIST = 0.1
     MX = 7
     MY = 9
-    traps = {(2, 0), (4, 0), (3, 1), (2, 8), (4, 8), (3, 7)}
-    ponds = {(x, y) for x in [1, 2, 4, 5] for y in [3, 4, 5]}
-    dens = [(3, 8), (3, 0)]
-    dirs = [(0, 1), (1, 0), (-1, 0), (0, -1)]
 
     rat, cat, dog, wolf, jaguar, tiger, lion, elephant = range(8)
+    # order in which moves() visits a player's pieces: the scan order (y,
+    # then x) of the initial board, taken pieces are skipped; it decides
+    # between equally scored moves
+    PIECE_ORDER = ((elephant, wolf, jaguar, rat, cat, dog, tiger, lion),
+                   (lion, tiger, dog, cat, rat, jaguar, wolf, elephant))
+
+    POND_MASK = cell_mask(PONDS, MX)
+    TRAP_MASK = cell_mask(TRAPS, MX)
+    DEN_MASK = (cell_mask(DENS[:1], MX), cell_mask(DENS[1:], MX))
+    NEIGHBOR = neighbor_table(MX, MY, DIRS)
+    CAN_BEAT = can_beat_table(rat, elephant)
+    MOVE_TABLE = move_table(NEIGHBOR, MX, POND_MASK, TRAP_MASK, DEN_MASK,
+                            CAN_BEAT, rat, (tiger, lion))
+
+    ZOBRIST, ZOBRIST_SIDE, ZOBRIST_PEACE = zobrist_keys(
+        MX * MY, MAXIMAL_PASSIVE)
+    # shared between all games (and copies of a game), entries are
+    # (key, depth, value, flag, best_move)
+    TT = [None] * TT_SIZE
 
     def __init__(self):
-        self.board = self.initial_board()
-        self.pieces = {0: {}, 1: {}}
+        board = self.initial_board()
+        # square -> 0 when empty, else 1 + player * 8 + piece
+        self.board = bytearray(Jungle.MX * Jungle.MY)
+        self.bb_piece = [[0] * 8, [0] * 8]
+        self.occ = [0, 0]
+        self.pieces = [[None] * 8, [None] * 8]
+        self.alive_mask = [0, 0]
+        self.hash = 0
 
         for y in range(Jungle.MY):
             for x in range(Jungle.MX):
-                C = self.board[y][x]
+                C = board[y][x]
                 if C:
                     pl, pc = C
-                    self.pieces[pl][pc] = (x, y)
+                    sq = y * Jungle.MX + x
+                    self.board[sq] = 1 + pl * 8 + pc
+                    self.pieces[pl][pc] = sq
+                    self.bb_piece[pl][pc] = 1 << sq
+                    self.occ[pl] |= 1 << sq
+                    self.alive_mask[pl] |= 1 << pc
+                    self.hash ^= Jungle.ZOBRIST[pl][pc][sq]
         self.curplayer = 0
         self.peace_counter = 0
         self.winner = None
+        self.killers = [None] * (MAX_DEPTH + 1)
 
     def initial_board(self):
         pieces = """
@@ -94,53 +234,53 @@ class Jungle:
             res.append(raw)
         return res
 
+    def snapshot(self):
+        return (bytes(self.board), tuple(self.bb_piece[0]),
+                tuple(self.bb_piece[1]), self.peace_counter, self.curplayer,
+                self.winner, self.hash)
+
+    def restore(self, s):
+        board, bb0, bb1, self.peace_counter, self.curplayer, self.winner, \
+            self.hash = s
+        self.board = bytearray(board)
+        self.bb_piece = [list(bb0), list(bb1)]
+        self.occ = [0, 0]
+        self.pieces = [[None] * 8, [None] * 8]
+        self.alive_mask = [0, 0]
+        for pl in [0, 1]:
+            for pc, bb in enumerate(self.bb_piece[pl]):
+                if bb:
+                    self.pieces[pl][pc] = bb.bit_length() - 1
+                    self.occ[pl] |= bb
+                    self.alive_mask[pl] |= 1 << pc
+
+    def piece_at(self, sq):
+        b = self.board[sq]
+        if b:
+            return (b - 1) >> 3, (b - 1) & 7
+        return None
+
+    def move_string(self, m):
+        if m is None:
+            return '-1 -1 -1 -1'
+        y, x = divmod(m[0], Jungle.MX)
+        y2, x2 = divmod(m[1], Jungle.MX)
+        return str(x)+' '+str(y)+' '+str(x2)+' '+str(y2)
+
     def random_move(self, player):
         ms = self.moves(player)
         if ms:
             return random.choice(ms)
         return None
 
-    def can_beat(self, p1, p2, pos1, pos2):
-        if pos1 in Jungle.ponds and pos2 in Jungle.ponds:
-            return True  # rat vs rat
-        if pos1 in Jungle.ponds:
-            return False  # rat in pond cannot beat any piece on land
-        if p1 == Jungle.rat and p2 == Jungle.elephant:
-            return True
-        if p1 == Jungle.elephant and p2 == Jungle.rat:
-            return False
-        if p1 >= p2:
-            return True
-        if pos2 in Jungle.traps:
-            return True
-        return False
-
     def pieces_comparison(self):
-        for i in range(7, -1, -1):
-            ps = []
-            for p in [0, 1]:
-                if i in self.pieces[p]:
-                    ps.append(p)
-            if len(ps) == 1:
-                return ps[0]
-        return None
-
-    def rat_is_blocking(self, player_unused, pos, dx, dy):
-        x, y = pos
-        nx = x + dx
-        for player in [0, 1]:
-            if Jungle.rat not in self.pieces[1-player]:
-                continue
-            rx, ry = self.pieces[1-player][Jungle.rat]
-            if (rx, ry) not in self.ponds:
-                continue
-            if dy != 0:
-                if x == rx:
-                    return True
-            if dx != 0:
-                if y == ry and abs(x-rx) <= 2 and abs(nx-rx) <= 2:
-                    return True
-        return False
+        # owner of the strongest piece that only one of the players still has
+        diff = self.alive_mask[0] ^ self.alive_mask[1]
+        if not diff:
+            return None
+        if self.alive_mask[0] >> (diff.bit_length() - 1) & 1:
+            return 0
+        return 1
 
     def draw(self):
         TT = {0: 'rcdwjtle', 1: 'RCDWJTLE'}
@@ -148,7 +288,7 @@ class Jungle:
 
             L = []
             for x in range(Jungle.MX):
-                b = self.board[y][x]
+                b = self.piece_at(y * Jungle.MX + x)
                 if b:
                     pl, pc = b
                     L.append(TT[pl][pc])
@@ -159,41 +299,35 @@ class Jungle:
 
     def moves(self, player):
         res = []
-        for p, pos in self.pieces[player].items():
-            x, y = pos
-            for (dx, dy) in Jungle.dirs:
-                pos2 = (nx, ny) = (x+dx, y+dy)
-                if 0 <= nx < Jungle.MX and 0 <= ny < Jungle.MY:
-                    if Jungle.dens[player] == pos2:
+        own = self.occ[player]
+        oponent = self.occ[1 - player]
+        table = Jungle.MOVE_TABLE[player]
+        append = res.append
+        rats = self.bb_piece[0][Jungle.rat] | self.bb_piece[1][Jungle.rat]
+        board = self.board
+        pieces = self.pieces[player]
+        for p in Jungle.PIECE_ORDER[player]:
+            pos = pieces[p]
+            if pos is None:
+                continue
+            for pos2, bit, block, beats in table[p][pos]:
+                if bit & own or block & rats:
+                    continue
+                victim = -1
+                if bit & oponent:
+                    victim = (board[pos2] - 1) & 7
+                    if not beats[victim]:
                         continue
-                    if pos2 in self.ponds:
-                        if p not in (Jungle.rat, Jungle.tiger, Jungle.lion):
-                            continue
-                        if p == Jungle.tiger or p == Jungle.lion:
-                            if dx != 0:
-                                dx *= 3
-                            if dy != 0:
-                                dy *= 4
-                            if self.rat_is_blocking(player, pos, dx, dy):
-                                continue
-                            pos2 = (nx, ny) = (x+dx, y+dy)
-                    if self.board[ny][nx] is not None:
-                        pl2, piece2 = self.board[ny][nx]
-                        if pl2 == player:
-                            continue
-                        if not self.can_beat(p, piece2, pos, pos2):
-                            continue
-                    res.append((pos, pos2))
+                append((pos, pos2, victim, p))
         return res
 
     def victory(self, player, mes):
         oponent = 1-player
-        if len(self.pieces[oponent]) == 0:
+        if not self.occ[oponent]:
             self.winner = player
             return True
 
-        x, y = self.dens[oponent]
-        if self.board[y][x]:
+        if (self.occ[0] | self.occ[1]) & Jungle.DEN_MASK[oponent]:
             self.winner = player
             return True
 
@@ -213,21 +347,29 @@ class Jungle:
         self.curplayer = 1 - self.curplayer
         if m is None:
             return
-        pos1, pos2 = m
-        x, y = pos1
-        pl, pc = self.board[y][x]
-
-        x2, y2 = pos2
-        if self.board[y2][x2]:  # piece taken!
-            pl2, pc2 = self.board[y2][x2]
-            del self.pieces[pl2][pc2]
+        pos1, pos2 = m[0], m[1]
+        pl, pc = self.piece_at(pos1)
+
+        taken = self.piece_at(pos2)
+        if taken:  # piece taken!
+            pl2, pc2 = taken
+            self.pieces[pl2][pc2] = None
+            self.bb_piece[pl2][pc2] = 0
+            self.occ[pl2] ^= 1 << pos2
+            self.alive_mask[pl2] ^= 1 << pc2
+            self.hash ^= Jungle.ZOBRIST[pl2][pc2][pos2]
             self.peace_counter = 0
         else:
             self.peace_counter += 1
 
-        self.pieces[pl][pc] = (x2, y2)
-        self.board[y2][x2] = (pl, pc)
-        self.board[y][x] = None
+        mask = (1 << pos1) | (1 << pos2)
+        self.hash ^= Jungle.ZOBRIST[pl][pc][pos1] ^ \
+            Jungle.ZOBRIST[pl][pc][pos2]
+        self.pieces[pl][pc] = pos2
+        self.bb_piece[pl][pc] ^= mask
+        self.occ[pl] ^= mask
+        self.board[pos2] = self.board[pos1]
+        self.board[pos1] = 0
 
     def update(self, player, move_string, mes):
         self.curplayer = player
@@ -240,9 +382,19 @@ class Jungle:
                 raise WrongMove
             move = None
         else:
-            move = ((move[0], move[1]), (move[2], move[3]))
-            if move not in possible_moves:
+            move = (move[1] * Jungle.MX + move[0],
+                    move[3] * Jungle.MX + move[2])
+            for m in possible_moves:
+                if m[:2] == move:
+                    move = m
+                    break
+            else:
                 raise WrongMove
+        return self.apply_move(player, move, mes)
+
+    def apply_move(self, player, move, mes="n"):
+        # move has to come from self.moves(player) (or None when there is none)
+        self.curplayer = player
         self.do_move(move)
 
         if self.victory(player, mes):
@@ -251,186 +403,202 @@ class Jungle:
         else:
             return None
 
-    def heur(self):
-        licz_1 = 0
-        licz_2 = 0
-        for i in range(7, -1, -1):
-            if i in self.pieces[1]:
-                licz_1 += Jungle.PIECE_VALUES[i]
-            # else:
-            #    licz_2 += Jungle.PIECE_VALUES[i]
-            if i in self.pieces[0]:
-                licz_2 += Jungle.PIECE_VALUES[i]
-            # else:
-            #    licz_1 += Jungle.PIECE_VALUES[i]
-        licz1_1 = len(self.moves(1))
-        licz1_2 = len(self.moves(0))
-        return A*(licz_1-licz_2) + B*(licz1_1-licz1_2)
+    def heur(self, side, cached_moves_len):
+        # scored for player 0, like utility(); cached_moves_len is
+        # len(self.moves(side)), known by the caller
+        material = MATERIAL_SUM[self.alive_mask[0]] - \
+            MATERIAL_SUM[self.alive_mask[1]]
+        if side == 0:
+            licz1_0 = cached_moves_len
+            licz1_1 = len(self.moves(1))
+        else:
+            licz1_0 = len(self.moves(0))
+            licz1_1 = cached_moves_len
+        return A*material + B*(licz1_0-licz1_1)
 
     def utility(self, p):
-        if self.victory(p, "n") < 0:
-            return (inf, 0, 0, 0, 0)
-        if self.victory(p, "n") == 0:
-            return (0, 0, 0, 0, 0)
-        if self.victory(p, "n") > 0:
-            return (-inf, 0, 0, 0, 0)
+        # called right after self.victory(p, ...) returned True, so
+        # self.winner is already set (a draw is player 0's victory); scored
+        # for player 0, like heur()
+        if self.winner == 0:
+            return inf
+        return -inf
 
     def cut_off_tests(self, depth):
-        if depth > MAX_DEPTH:
+        # depth is the number of plies left below this one
+        if depth < 0:
             return True
         return False
 
-    def max_alpha_beta(self, alpha, beta, depth, start):
-        px = None
-        py = None
-        px_2 = None
-        py_2 = None
-        player = 0
-        mov = self.moves(player)
+    def tt_key(self, player):
+        pc = min(self.peace_counter, Jungle.MAXIMAL_PASSIVE)
+        return self.hash ^ Jungle.ZOBRIST_SIDE[player] ^ \
+            Jungle.ZOBRIST_PEACE[pc]
+
+    def tt_probe(self, key):
+        entry = Jungle.TT[key & (TT_SIZE - 1)]
+        if entry is not None and entry[0] == key:
+            return entry
+        return None
+
+    def tt_store(self, key, depth, value, flag, best_move):
+        i = key & (TT_SIZE - 1)
+        entry = Jungle.TT[i]
+        if entry is None or entry[1] <= depth:  # replace by depth
+            Jungle.TT[i] = (key, depth, value, flag, best_move)
+
+    def order_moves(self, moves, depth, best_move):
+        # captures first (most valuable victim, least valuable attacker),
+        # then the killer move of this ply, the move from the TT goes first;
+        # the sort is stable, so quiet moves keep the order of moves()
+        pv = PIECE_VALUES
+        moves.sort(key=lambda m: -(pv[m[2]] * 16 - m[3]) if m[2] >= 0
+                   else 0)
+        killer = self.killers[depth]
+        if killer is not None and killer in moves:
+            moves.remove(killer)
+            i = 0
+            while i < len(moves) and moves[i][2] >= 0:
+                i += 1
+            moves.insert(i, killer)
+        if best_move is not None and best_move in moves:
+            moves.remove(best_move)
+            moves.insert(0, best_move)
+
+    def iterative_deepening(self, player=0):
+        value = None
+        for d in range(MAX_DEPTH + 1):
+            if value is None or value in (inf, -inf):
+                alpha, beta = -inf, inf
+            else:
+                alpha, beta = value - ASPIRATION, value + ASPIRATION
+            value, move = self.search_root(alpha, beta, d, player)
+            if (value <= alpha or value >= beta) and \
+                    (alpha, beta) != (-inf, inf):
+                value, move = self.search_root(-inf, inf, d, player)
+        return value, move
+
+    def search_root(self, alpha, beta, depth, player=0):
+        # (value for player, best move), the move is None if there is none
+        self.root_move = None
+        value = self.negamax(alpha, beta, depth, player, True)
+        return value, self.root_move
+
+    def negamax(self, alpha, beta, depth, player, start=False):
+        # value of the position for player, who is to move; heur() and
+        # utility() both score it for player 0, sign turns that around
+        # for player 1
+        sign = 1 if player == 0 else -1
+        key = self.tt_key(player)
+        entry = self.tt_probe(key)
+        best_move = None
+        if entry is not None:
+            best_move = entry[4]
+            if not start and entry[1] >= depth:
+                value, flag = entry[2], entry[3]
+                if flag == EXACT or (flag == LOWER and value >= beta) \
+                        or (flag == UPPER and value <= alpha):
+                    return value
         if self.victory(player, "n"):
-            return self.utility(player,)
+            value = sign * self.utility(player)
+            self.tt_store(key, depth, value, EXACT, None)
+            return value
+        mov = self.moves(player)
         if self.cut_off_tests(depth):
-            return (self.heur(), 0, 0, 0, 0)
+            value = sign * self.heur(player, len(mov))
+            self.tt_store(key, depth, value, EXACT, None)
+            return value
+        alpha_0 = alpha
         value = -inf
         moves = mov
-        if mov != [None]:
-            for iter in moves:
-                (a, b), (c, d) = iter
-                zbicie = 0
-                # affect
-                pl, pc = self.board[b][a]
-                pl2, pc2 = 0, 0
-                p_c = self.peace_counter
-                if self.board[d][c]:  # piece taken!
-                    pl2, pc2 = self.board[d][c]
-                    del self.pieces[pl2][pc2]
-                    self.peace_counter = 0
-                    zbicie = 1
-                else:
-                    self.peace_counter += 1
-                self.pieces[pl][pc] = (c, d)
-                self.board[d][c] = (pl, pc)
-                self.board[b][a] = None
-                # end of affect
-                (m, min_i, in_j, cos, cos1) = self.min_alpha_beta(
-                    alpha, beta, depth + 1, False)
-                if m > value:
-                    value = m
-                    px = a
-                    py = b
-                    px_2 = c
-                    py_2 = d
-                # undo everything
-                if zbicie == 1:
-                    self.pieces[pl2][pc2] = (c, d)
-                    self.peace_counter = p_c
-                    self.board[b][a] = (pl, pc)
-                    self.board[d][c] = (pl2, pc2)
-                    self.pieces[pl][pc] = (a, b)
-                else:
-                    self.peace_counter -= 1
-                    self.board[b][a] = (pl, pc)
-                    self.board[d][c] = None
-                    self.pieces[pl][pc] = (a, b)
-                # end of undo
-                if value >= beta:
-                    return (value, px, py, px_2, py_2)
-
-                if value > alpha:
-                    alpha = value
-        else:
-            (m, min_i, in_j, cos, cos1) = self.min_alpha_beta(
-                alpha, beta, depth + 1, False)
-            if m > value:
+        self.order_moves(moves, depth, best_move)
+        best_move = None
+        board = self.board
+        pieces = self.pieces
+        bb_piece = self.bb_piece
+        occ = self.occ
+        alive_mask = self.alive_mask
+        zobrist = Jungle.ZOBRIST
+        if not moves:
+            # no move is possible, the player has to pass (do_move(None))
+            value = -self.negamax(-beta, -alpha, depth - 1, 1 - player)
+        for iter in moves:
+            pos1, pos2, pc2, pc = iter
+            zbicie = 0
+            # affect
+            pl, pl2 = player, 1 - player
+            p_c = self.peace_counter
+            h = self.hash
+            mask = (1 << pos1) | (1 << pos2)
+            if pc2 >= 0:  # piece taken!
+                pieces[pl2][pc2] = None
+                bb_piece[pl2][pc2] = 0
+                occ[pl2] ^= 1 << pos2
+                alive_mask[pl2] ^= 1 << pc2
+                self.hash ^= zobrist[pl2][pc2][pos2]
+                self.peace_counter = 0
+                zbicie = 1
+            else:
+                self.peace_counter += 1
+            self.hash ^= zobrist[pl][pc][pos1] ^ zobrist[pl][pc][pos2]
+            pieces[pl][pc] = pos2
+            bb_piece[pl][pc] ^= mask
+            occ[pl] ^= mask
+            board[pos2] = board[pos1]
+            board[pos1] = 0
+            # end of affect
+            m = -self.negamax(-beta, -alpha, depth - 1, pl2)
+            # undo everything
+            self.hash = h
+            bb_piece[pl][pc] ^= mask
+            occ[pl] ^= mask
+            pieces[pl][pc] = pos1
+            board[pos1] = board[pos2]
+            board[pos2] = 0
+            if zbicie == 1:
+                board[pos2] = 1 + pl2 * 8 + pc2
+                pieces[pl2][pc2] = pos2
+                bb_piece[pl2][pc2] = 1 << pos2
+                occ[pl2] |= 1 << pos2
+                alive_mask[pl2] |= 1 << pc2
+                self.peace_counter = p_c
+            else:
+                self.peace_counter -= 1
+            # end of undo
+            if m > value or best_move is None:
                 value = m
-            if value >= beta:
-                return (value, px, py, px_2, py_2)
-
+                best_move = iter
             if value > alpha:
                 alpha = value
-
-        return (value, px, py, px_2, py_2)
-
-    def min_alpha_beta(self, alpha, beta, depth, start):
-        player = 1
-        qx = None
-        qy = None
-        qx1 = None
-        qy1 = None
-        mov = self.moves(player)
-        if self.victory(player, "n"):
-            return self.utility(player)
-        if self.cut_off_tests(depth):
-            return (self.heur(), 0, 0, 0, 0)
-        minv = inf
-        moves = mov
-        if mov != [None]:
-            for iter in moves:
-                # affect
-                (a, b), (c, d) = iter
-                zbicie = 0
-                pl, pc = self.board[b][a]
-                pl2, pc2 = 0, 0
-                p_c = self.peace_counter
-                if self.board[d][c]:  # piece taken!
-                    pl2, pc2 = self.board[d][c]
-                    del self.pieces[pl2][pc2]
-                    self.peace_counter = 0
-                    zbicie = 1
-                else:
-                    self.peace_counter += 1
-                self.pieces[pl][pc] = (c, d)
-                self.board[d][c] = (pl, pc)
-                self.board[b][a] = None
-                # end of affect
-                (m, max_i, max_j, cos, cos1) = self.max_alpha_beta(
-                    alpha, beta, depth + 1, False)
-                if m < minv:
-                    minv = m
-                    qx = a
-                    qy = b
-                    qx1 = c
-                    qy1 = d
-                # undo everything
-                if zbicie == 1:
-                    self.pieces[pl2][pc2] = (c, d)
-                    self.peace_counter = p_c
-                    self.board[b][a] = (pl, pc)
-                    self.board[d][c] = (pl2, pc2)
-                    self.pieces[pl][pc] = (a, b)
-                else:
-                    self.peace_counter -= 1
-                    self.board[b][a] = (pl, pc)
-                    self.board[d][c] = None
-                    self.pieces[pl][pc] = (a, b)
-                # koniec undo
-
-                if minv <= alpha:
-                    return (minv, qx, qy, qx1, qy1)
-
-                if minv < beta:
-                    beta = minv
+            if alpha >= beta:
+                if pc2 < 0:
+                    self.killers[depth] = iter
+                break
+
+        if value <= alpha_0:
+            flag = UPPER
+        elif value >= beta:
+            flag = LOWER
         else:
-            (m, max_i, max_j, cos, cos1) = self.max_alpha_beta(
-                alpha, beta, depth + 1, False)
-            if m < minv:
-                minv = m
-            if minv <= alpha:
-                return (minv, qx, qy, qx1, qy1)
-
-            if minv < beta:
-                beta = minv
-
-        return (minv, qx, qy, qx1, qy1)
+            flag = EXACT
+        self.tt_store(key, depth, value, flag, best_move)
+        if start:
+            self.root_move = best_move
+        return value
 
 
 class Player(object):
-    def __init__(self):
+    def __init__(self, workers=1):
+        # workers > 1 splits the playouts of the root moves between processes
+        self.workers = workers
+        self.executor = None
         self.reset()
 
     def reset(self):
         self.game = Jungle()
         self.my_player = 1
+        # seeded from the global generator so random.seed() still reproduces
+        self.rng = random.Random(random.getrandbits(64))
 
     def say(self, what):
         sys.stdout.write(what)
@@ -441,11 +609,8 @@ class Player(object):
         line = sys.stdin.readline().split()
         return line[0], line[1:]
 
-    def sym(self, J, move):
-        (a, b), (c, d) = move
-        move_string = str(a)+' '+str(b)+' '+str(c)+' '+str(d)
-        J.curplayer = 1
-        kon = J.update(1, move_string, "n")
+    def sym(self, J, move, rng):
+        kon = J.apply_move(1, move)
         if kon != None:
             if kon == 1:
                 return True
@@ -458,54 +623,87 @@ class Player(object):
             J.curplayer = 0
             moves = J.moves(0)
             if moves:
-                move = random.choice(moves)
-                (a, b), (c, d) = move
-                move_string = str(a)+' '+str(b)+' '+str(c)+' '+str(d)
-                kon = J.update(0, move_string, "n")
+                move = moves[rng.randrange(len(moves))]
+                kon = J.apply_move(0, move)
                 if kon != None:
                     if kon == 1:
                         return True
                     else:
                         return False
-                move = (move[0][0], move[0][1], move[1][0], move[1][1])
             else:
                 J.do_move(None)
                 move = (-1, -1, -1, -1)
             # move of my opponent - 1
             movess = J.moves(1)
             if movess:
-                move = random.choice(movess)
-                (a, b), (c, d) = move
-                move_string = str(a)+' '+str(b)+' '+str(c)+' '+str(d)
-                kon = J.update(1, move_string, "n")
+                move = movess[rng.randrange(len(movess))]
+                kon = J.apply_move(1, move)
                 if kon != None:
                     if kon == 1:
                         return True
                     else:
                         return False
-                move = (move[0][0], move[0][1], move[1][0], move[1][1])
             else:
                 J.do_move(None)
                 move = (-1, -1, -1, -1)
 
+    def score_move(self, snap, move, seed):
+        # the playouts of one move have their own seed, so they come out the
+        # same in the main process and in a worker
+        rng = random.Random(seed)
+        licz = 0
+        for j in range(LICZ_ROZGR):
+            self.game.restore(snap)
+            if self.sym(self.game, move, rng):
+                licz += 1
+        return licz
+
+    def score_moves(self, snap, mov):
+        seeds = [self.rng.getrandbits(64) for i in mov]
+        if self.executor is None or len(mov) < 2:
+            return [self.score_move(snap, i, seed)
+                    for i, seed in zip(mov, seeds)]
+        # the first move is scored here while the others run in the pool
+        futures = [self.executor.submit(score_move, snap, i, seed)
+                   for i, seed in zip(mov[1:], seeds[1:])]
+        scores = [self.score_move(snap, mov[0], seeds[0])]
+        scores.extend(f.result() for f in futures)
+        return scores
+
     def loop(self):
+        if self.workers > 1:
+            self.executor = ProcessPoolExecutor(self.workers)
+        try:
+            return self.play()
+        finally:
+            if self.executor is not None:
+                self.executor.shutdown()
+                self.executor = None
+
+    def mc_move(self):
+        mov = self.game.moves(1)
+        if not mov:
+            return None  # update() plays the pass
+        max_wygr = -1
+        max_move = []
+        snap = self.game.snapshot()
+        for i, licz in zip(mov, self.score_moves(snap, mov)):
+            if max_wygr <= licz:
+                max_wygr = licz
+                max_move.append(i)
+        self.game.restore(snap)
+        return self.rng.choice(max_move)
+
+    def play(self):
         player = 1
         op = 0
         while True:
             # self.game.draw()
-            mov = self.game.moves(1)
-            max_wygr = -1
-            max_move = []
-            for i in mov:
-                licz = 0
-                for j in range(LICZ_ROZGR):
-                    if self.sym(copy.deepcopy(self.game), i):
-                        licz += 1
-                if max_wygr <= licz:
-                    max_wygr = licz
-                    max_move.append(i)
-            (a, b), (c, d) = random.choice(max_move)
-            move_string = str(a)+' '+str(b)+' '+str(c)+' '+str(d)
+            if MC_OPPONENT:
+                move = self.mc_move()
+            else:
+                (m, move) = self.game.iterative_deepening(1)
+            move_string = self.game.move_string(move)
             kon = self.game.update(1, move_string, "gl1")
             if kon != None:
                 if kon == 1:
@@ -515,20 +713,47 @@ class Player(object):
             if player == 0:
                 self.my_player = 0
             st = time.time()
-            (m, aa, bb, cc, dd) = self.game.max_alpha_beta(-inf, inf, 0, True)
+            (m, move) = self.game.iterative_deepening()
             en = time.time()
-            move_string = str(aa)+' '+str(bb)+' '+str(cc)+' '+str(dd)
-            if aa != None:
-                self.game.update(0, move_string, "gl0")
+            if move != None:
+                move_string = self.game.move_string(move)
+                kon = self.game.update(0, move_string, "gl0")
+                if kon != None:
+                    if kon == 1:
+                        return True
+                    else:
+                        return False
+
+
+def score_move(snap, move, seed):
+    # runs in a worker process of Player.executor
+    return Player().score_move(snap, move, seed)
+
+
+def run_one_game(seed, workers=1):
+    # the TT would otherwise carry over from the games played before in the
+    # same process, this way a game only depends on its seed
+    Jungle.TT = [None] * TT_SIZE
+    random.seed(seed)
+    player = Player(workers)
+    return player.loop(), player.game.snapshot()
 
 
 if __name__ == '__main__':
     count_win = 0
-    for i in range(0, 10):
-        player = Player()
-        if player.loop():  # agent 1 won
+    seeds = range(0, 10)
+    if WORKERS > 1:
+        # a game's own pool cannot be started from a Pool worker
+        results = [run_one_game(seed, WORKERS) for seed in seeds]
+    else:
+        with Pool() as pool:
+            results = pool.map(run_one_game, seeds)
+    for lost, state in results:
+        if lost:  # agent 1 won
             print("The state in which my agent failed: ")
-            player.game.draw()
+            game = Jungle()
+            game.restore(state)
+            game.draw()
         else:  # agent 0 won
             count_win += 1
     print("The agent won " + str(count_win) + " times.")